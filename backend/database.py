@@ -1,11 +1,46 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, Index
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
 from datetime import datetime
+from uuid import uuid4
 from config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+CONNECT_ARGS = {"server_settings": {"jit": "off"}, "timeout": 10}
+
+if settings.DB_USE_PGBOUNCER:
+    # PgBouncer (transaction mode) does the pooling, and prepared statements
+    # don't survive across its transactions. Turning off asyncpg's and
+    # SQLAlchemy's statement caches isn't enough on its own: the dialect still
+    # prepares statements under sequential names that collide across backend
+    # connections, so each one gets a unique name
+    engine = create_async_engine(
+        make_url(DATABASE_URL).update_query_dict({"prepared_statement_cache_size": "0"}),
+        poolclass=NullPool,
+        connect_args={
+            **CONNECT_ARGS,
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    )
+else:
+    # Recycle connections instead of pinging on every checkout
+    engine = create_async_engine(
+        DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=1800,
+        pool_pre_ping=False,
+        connect_args=CONNECT_ARGS
+    )
+AsyncSessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 Base = declarative_base()
 
 class AQIRecord(Base):
@@ -27,10 +62,20 @@ class AQIRecord(Base):
     humidity = Column(Float, nullable=True)
     wind_speed = Column(Float, nullable=True)
     pressure = Column(Float, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
     
     __table_args__ = (
-        Index('idx_city_timestamp', 'city', 'timestamp'),
+        # Rows arrive in time order, so a BRIN range index is enough for
+        # timestamp scans at a fraction of a btree's size
+        Index('idx_ts_brin', 'timestamp', postgresql_using='brin'),
+        # Matches "latest records for a city" lookups without a sort
+        Index('idx_city_ts_desc', city, timestamp.desc()),
+        # Lets substring (ILIKE '%city%') searches use an index
+        Index(
+            'idx_city_trgm', 'city',
+            postgresql_using='gin',
+            postgresql_ops={'city': 'gin_trgm_ops'}
+        ),
     )
 
 class AQIPrediction(Base):
@@ -58,13 +103,18 @@ class Location(Base):
     lat = Column(Float)
     lon = Column(Float)
     is_active = Column(Integer, default=1)
+    
+    __table_args__ = (
+        # Bounding box prefilter for nearby searches
+        Index('idx_active_lat_lon', 'is_active', 'lat', 'lon'),
+    )
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+async def init_db():
+    async with engine.begin() as conn:
+        # Required by the trigram index on aqi_records.city
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
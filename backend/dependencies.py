@@ -0,0 +1,16 @@
+from fastapi import Request
+from ml.predict import AQIPredictor
+from services.weather_service import WeatherService
+from services.aqi_service import AQIService
+
+def get_weather_service(request: Request) -> WeatherService:
+    """Shared weather service created at startup"""
+    return request.app.state.weather_service
+
+def get_aqi_service(request: Request) -> AQIService:
+    """Shared AQI service created at startup"""
+    return request.app.state.aqi_service
+
+def get_predictor(request: Request) -> AQIPredictor:
+    """Shared predictor loaded once at startup"""
+    return request.app.state.predictor
\ No newline at end of file
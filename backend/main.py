@@ -1,34 +1,69 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi.responses import ORJSONResponse
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from contextlib import asynccontextmanager
+import atexit
+import httpx
 import logging
+import logging.handlers
+import queue
+import time
+from sqlalchemy import text
 from config import settings
-from database import init_db, SessionLocal
+from database import init_db, engine, AsyncSessionLocal
+from middleware import HTTPCacheMiddleware
 from routes import aqi, locations
 from ml.data_collector import DataCollector
+from ml.predict import AQIPredictor
+from services import cache
+from services.http import create_client
+from services.weather_service import WeatherService
+from services.aqi_service import AQIService
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging; records are formatted and written on a background thread
+log_queue = queue.Queue(-1)
+log_stream = logging.StreamHandler()
+log_stream.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream)
+log_listener.start()
+# Flush queued records at exit, including CLI runs that never reach the lifespan
+atexit.register(log_listener.stop)
+log_handler = logging.handlers.QueueHandler(log_queue)
+log_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
 # Background scheduler for data collection
-scheduler = BackgroundScheduler()
+scheduler = AsyncIOScheduler()
+
+# Health checks hit the database at most once per interval
+HEALTH_CHECK_TTL = 5.0
+_db_health = (float("-inf"), "unknown")
+
+async def initialize_default_locations():
+    """Seed the default monitored cities with a fresh session"""
+    async with AsyncSessionLocal() as db:
+        collector = DataCollector(db)
+        await collector.initialize_default_locations()
 
-def scheduled_data_collection():
+async def collect_active_locations(http: httpx.AsyncClient = None):
+    """Collect data for all active locations with a fresh session"""
+    if http is None:
+        async with create_client() as http:
+            return await collect_active_locations(http)
+    
+    async with AsyncSessionLocal() as db:
+        collector = DataCollector(db, http)
+        return await collector.collect_all_active_locations()
+
+async def scheduled_data_collection():
     """Periodic data collection job"""
     logger.info("Running scheduled data collection")
-    db = SessionLocal()
     try:
-        collector = DataCollector(db)
-        collector.collect_all_active_locations()
+        await collect_active_locations(app.state.http)
     except Exception as e:
         logger.error(f"Error in scheduled collection: {e}")
-    finally:
-        db.close()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,21 +72,29 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Lumair API...")
     
     # Initialize database
-    init_db()
+    await init_db()
     logger.info("Database initialized")
     
+    # Shared HTTP session and services for external API calls
+    app.state.http = create_client()
+    app.state.weather_service = WeatherService(app.state.http)
+    app.state.aqi_service = AQIService(app.state.http)
+    
+    # Load the prediction model once and share it across requests
+    app.state.predictor = AQIPredictor(app.state.http)
+    app.state.predictor.warmup()
+    app.state.predictor.start_batcher()
+    
     # Initialize default locations
-    db = SessionLocal()
-    try:
-        collector = DataCollector(db)
-        collector.initialize_default_locations()
-        
-        # Initial data collection
-        collector.collect_all_active_locations()
-    except Exception as e:
-        logger.error(f"Error during initialization: {e}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        try:
+            collector = DataCollector(db, app.state.http)
+            await collector.initialize_default_locations()
+            
+            # Initial data collection
+            await collector.collect_all_active_locations()
+        except Exception as e:
+            logger.error(f"Error during initialization: {e}")
     
     # Start scheduler
     scheduler.add_job(
@@ -69,6 +112,10 @@ async def lifespan(app: FastAPI):
     # Shutdown
     scheduler.shutdown()
     logger.info("Scheduler stopped")
+    await app.state.predictor.stop_batcher()
+    await app.state.http.aclose()
+    await cache.close()
+    await engine.dispose()
     logger.info("Lumair API shutting down")
 
 # Create FastAPI app
@@ -76,7 +123,8 @@ app = FastAPI(
     title="Lumair API",
     description="AI-powered air quality prediction system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -88,14 +136,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ETag/Cache-Control on read endpoints
+app.add_middleware(HTTPCacheMiddleware)
+
 # Include routers
 app.include_router(aqi.router)
 app.include_router(locations.router)
 
-@app.get("/")
-async def root():
-    """Root endpoint"""
-    return {
+# Static root payload, serialized once at import
+_ROOT_RESP = ORJSONResponse(
+    {
         "message": "Lumair API",
         "version": "1.0.0",
         "status": "running",
@@ -104,16 +154,50 @@ async def root():
             "aqi": "/api/aqi",
             "locations": "/api/locations"
         }
-    }
+    },
+    headers={"Cache-Control": "public, max-age=3600"}
+)
+
+async def database_status() -> str:
+    """Check database connectivity, reusing the result for HEALTH_CHECK_TTL seconds"""
+    global _db_health
+    checked_at, status = _db_health
+    now = time.monotonic()
+    
+    if now - checked_at < HEALTH_CHECK_TTL:
+        return status
+    
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        status = "connected"
+    except Exception as e:
+        logger.error(f"Database health check failed: {e}")
+        status = "disconnected"
+    
+    _db_health = (now, status)
+    return status
+
+@app.get("/")
+async def root():
+    """Root endpoint"""
+    return _ROOT_RESP
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "database": "connected",
-        "scheduler": "active" if scheduler.running else "inactive"
-    }
+    db_status = await database_status()
+    healthy = db_status == "connected"
+    
+    return ORJSONResponse(
+        {
+            "status": "healthy" if healthy else "unhealthy",
+            "database": db_status,
+            "scheduler": "active" if scheduler.running else "inactive"
+        },
+        status_code=200 if healthy else 503,
+        headers={"Cache-Control": f"public, max-age={int(HEALTH_CHECK_TTL)}"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
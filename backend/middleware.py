@@ -0,0 +1,78 @@
+import hashlib
+from starlette.datastructures import Headers, MutableHeaders
+
+# Browser/CDN cache lifetime (seconds) for read endpoints, by path prefix
+CACHE_MAX_AGE = (
+    ("/api/aqi/current/", 300),
+    ("/api/aqi/predict", 600),
+    ("/api/aqi/historical/", 900),
+    ("/api/aqi/compare", 300),
+    ("/api/locations/popular", 3600),
+    ("/api/locations/search", 3600),
+    ("/api/locations/nearby", 3600),
+)
+
+def _max_age(path: str):
+    """Cache lifetime for path, or None if it isn't a cacheable read endpoint"""
+    for prefix, max_age in CACHE_MAX_AGE:
+        if path.startswith(prefix):
+            return max_age
+    return None
+
+class HTTPCacheMiddleware:
+    """Add ETag/Cache-Control to JSON read responses and answer If-None-Match with 304"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        
+        max_age = _max_age(scope["path"])
+        if max_age is None:
+            return await self.app(scope, receive, send)
+        
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        start = None
+        passthrough = False
+        chunks = []
+        
+        async def send_with_etag(message):
+            nonlocal start, passthrough
+            
+            if message["type"] == "http.response.start":
+                # Errors and streamed (NDJSON) bodies go out untouched
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if message["status"] != 200 or not content_type.startswith("application/json"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            
+            if passthrough:
+                await send(message)
+                return
+            
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            
+            body = b"".join(chunks)
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["ETag"] = etag
+            headers.setdefault("Cache-Control", f"public, max-age={max_age}")
+            
+            if etag in (tag.strip() for tag in if_none_match.split(",")):
+                del headers["content-length"]
+                del headers["content-type"]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+        
+        await self.app(scope, receive, send_with_etag)
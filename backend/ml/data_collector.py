@@ -1,114 +1,141 @@
+import asyncio
+import time
+import httpx
 import pandas as pd
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import AQIRecord, Location
 from services.weather_service import WeatherService
 from services.aqi_service import AQIService
+from services import cache
 import logging
 
 logger = logging.getLogger(__name__)
 
 class DataCollector:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, http: httpx.AsyncClient = None):
         self.db = db
-        self.weather_service = WeatherService()
-        self.aqi_service = AQIService()
+        self.weather_service = WeatherService(http)
+        self.aqi_service = AQIService(http)
     
-    def collect_and_store(self, city: str, lat: float, lon: float, country: str = None):
-        """Collect current AQI and weather data and store in database"""
+    async def collect_and_store(self, city: str, lat: float, lon: float, country: str = None):
+        """Collect current AQI and weather data as an AQIRecord row"""
         try:
-            # Fetch AQI data
-            aqi_data = self.aqi_service.get_current_aqi(lat, lon)
+            # Fetch AQI and weather data concurrently
+            aqi_data, weather_data = await asyncio.gather(
+                self.aqi_service.get_current_aqi(lat, lon),
+                self.weather_service.get_current_weather(lat, lon)
+            )
             if not aqi_data:
                 logger.warning(f"No AQI data for {city}")
-                return False
+                return None
             
-            # Fetch weather data
-            weather_data = self.weather_service.get_current_weather(lat, lon)
             if not weather_data:
                 logger.warning(f"No weather data for {city}")
                 weather_data = {}
             
-            # Create record
-            record = AQIRecord(
-                city=city,
-                country=country or "Unknown",
-                lat=lat,
-                lon=lon,
-                aqi=aqi_data.get("aqi"),
-                pm25=aqi_data.get("pm25"),
-                pm10=aqi_data.get("pm10"),
-                o3=aqi_data.get("o3"),
-                no2=aqi_data.get("no2"),
-                so2=aqi_data.get("so2"),
-                co=aqi_data.get("co"),
-                temperature=weather_data.get("temperature"),
-                humidity=weather_data.get("humidity"),
-                wind_speed=weather_data.get("wind_speed"),
-                pressure=weather_data.get("pressure"),
-                timestamp=datetime.utcnow()
-            )
-            
-            self.db.add(record)
-            self.db.commit()
-            logger.info(f"Collected and stored data for {city}")
-            return True
+            logger.debug(f"Collected data for {city}")
+            return {
+                "city": city,
+                "country": country or "Unknown",
+                "lat": lat,
+                "lon": lon,
+                "aqi": aqi_data.get("aqi"),
+                "pm25": aqi_data.get("pm25"),
+                "pm10": aqi_data.get("pm10"),
+                "o3": aqi_data.get("o3"),
+                "no2": aqi_data.get("no2"),
+                "so2": aqi_data.get("so2"),
+                "co": aqi_data.get("co"),
+                "temperature": weather_data.get("temperature"),
+                "humidity": weather_data.get("humidity"),
+                "wind_speed": weather_data.get("wind_speed"),
+                "pressure": weather_data.get("pressure"),
+                "timestamp": datetime.utcnow()
+            }
             
         except Exception as e:
             logger.error(f"Error collecting data for {city}: {e}")
-            self.db.rollback()
-            return False
+            return None
     
-    def collect_all_active_locations(self):
+    async def collect_all_active_locations(self):
         """Collect data for all active locations in database"""
-        locations = self.db.query(Location).filter(Location.is_active == 1).all()
+        start = time.perf_counter()
+        result = await self.db.execute(select(Location).where(Location.is_active == 1))
+        locations = result.scalars().all()
         
-        success_count = 0
-        for location in locations:
-            if self.collect_and_store(
+        tasks = [
+            self.collect_and_store(
                 location.city, 
                 location.lat, 
                 location.lon, 
                 location.country
-            ):
-                success_count += 1
+            )
+            for location in locations
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        rows = [r for r in results if isinstance(r, dict)]
+        success_count = len(rows)
+        
+        if not rows:
+            logger.warning(f"Collected 0/{len(locations)} in {time.perf_counter() - start:.2f}s")
+            return 0
         
-        logger.info(f"Data collection complete: {success_count}/{len(locations)} successful")
+        # Store the whole cycle in a single multi-row INSERT
+        try:
+            await self.db.execute(insert(AQIRecord), rows)
+            await self.db.commit()
+        except Exception as e:
+            logger.error(f"Error storing collected data: {e}")
+            await self.db.rollback()
+            return 0
+        
+        # Fresh records supersede any cached current AQI responses
+        await cache.delete(*{cache.current_aqi_key(row['city']) for row in rows})
+        
+        logger.info(f"Collected {success_count}/{len(locations)} in {time.perf_counter() - start:.2f}s")
         return success_count
     
-    def get_training_data(self, city: str = None, days: int = 90) -> pd.DataFrame:
+    async def get_training_data(self, city: str = None, days: int = 90) -> pd.DataFrame:
         """Retrieve historical data for model training"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        query = self.db.query(AQIRecord).filter(AQIRecord.timestamp >= cutoff_date)
+        query = select(
+            AQIRecord.city,
+            AQIRecord.aqi,
+            AQIRecord.pm25,
+            AQIRecord.pm10,
+            AQIRecord.o3,
+            AQIRecord.no2,
+            AQIRecord.so2,
+            AQIRecord.co,
+            AQIRecord.temperature,
+            AQIRecord.humidity,
+            AQIRecord.wind_speed,
+            AQIRecord.pressure,
+            AQIRecord.timestamp
+        ).where(AQIRecord.timestamp >= cutoff_date)
         
         if city:
-            query = query.filter(AQIRecord.city == city)
+            query = query.where(AQIRecord.city == city)
+        
+        query = query.order_by(AQIRecord.timestamp)
         
-        records = query.order_by(AQIRecord.timestamp).all()
+        # Build the frame straight from the cursor instead of per-row dicts
+        df = await self.db.run_sync(
+            lambda session: pd.read_sql(query, session.connection())
+        )
         
-        data = [{
-            "city": r.city,
-            "aqi": r.aqi,
-            "pm25": r.pm25,
-            "pm10": r.pm10,
-            "o3": r.o3,
-            "no2": r.no2,
-            "so2": r.so2,
-            "co": r.co,
-            "temperature": r.temperature,
-            "humidity": r.humidity,
-            "wind_speed": r.wind_speed,
-            "pressure": r.pressure,
-            "timestamp": r.timestamp,
-            "hour": r.timestamp.hour,
-            "day_of_week": r.timestamp.weekday(),
-            "month": r.timestamp.month
-        } for r in records]
+        ts = pd.to_datetime(df['timestamp'])
+        df['hour'] = ts.dt.hour
+        df['day_of_week'] = ts.dt.dayofweek
+        df['month'] = ts.dt.month
         
-        return pd.DataFrame(data)
+        return df
     
-    def initialize_default_locations(self):
+    async def initialize_default_locations(self):
         """Add default major cities to monitor"""
         default_cities = [
             {"city": "Mumbai", "country": "India", "lat": 19.0760, "lon": 72.8777},
@@ -121,18 +148,15 @@ class DataCollector:
             {"city": "Paris", "country": "France", "lat": 48.8566, "lon": 2.3522},
         ]
         
-        for city_data in default_cities:
-            existing = self.db.query(Location).filter(
-                Location.city == city_data["city"]
-            ).first()
-            
-            if not existing:
-                location = Location(**city_data)
-                self.db.add(location)
+        # One idempotent round-trip, safe when several workers start at once
+        stmt = pg_insert(Location).values(default_cities).on_conflict_do_nothing(
+            index_elements=["city"]
+        )
         
         try:
-            self.db.commit()
+            await self.db.execute(stmt)
+            await self.db.commit()
             logger.info("Default locations initialized")
         except Exception as e:
             logger.error(f"Error initializing locations: {e}")
-            self.db.rollback()
\ No newline at end of file
+            await self.db.rollback()
\ No newline at end of file
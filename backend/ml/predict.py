@@ -1,172 +1,265 @@
+import asyncio
+import httpx
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import joblib
+import xgboost as xgb
 import os
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from services.weather_service import WeatherService
 from services.aqi_service import AQIService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Concurrent inference calls arriving within this window share one model call
+BATCH_WINDOW = 0.02  # seconds
+BATCH_SIZE = 64
+
+# Column order the model was trained on (see AQIModelTrainer.train)
+FEATURE_ORDER = (
+    'pm25', 'pm10', 'o3', 'no2', 'so2', 'co',
+    'temperature', 'humidity', 'wind_speed', 'pressure',
+    'hour', 'day_of_week', 'month', 'is_weekend',
+    'aqi_lag_1', 'aqi_lag_24',
+    'pm25_lag_1', 'pm25_lag_24',
+    'pm10_lag_1', 'pm10_lag_24',
+    'temperature_lag_1', 'temperature_lag_24',
+    'humidity_lag_1', 'humidity_lag_24',
+    'aqi_rolling_mean_24', 'pm25_rolling_mean_24', 'temperature_rolling_mean_24',
+)
+
 class AQIPredictor:
-    def __init__(self, model_path="./ml/models"):
+    def __init__(self, http: httpx.AsyncClient, model_path="./ml/models"):
         self.model_path = model_path
-        self.model = None
-        self.scaler = None
-        self.weather_service = WeatherService()
-        self.aqi_service = AQIService()
+        self.booster = None
+        self._queue = None
+        self._batcher = None
+        self.weather_service = WeatherService(http)
+        self.aqi_service = AQIService(http)
         self.load_model()
     
     def load_model(self):
-        """Load trained model and scaler"""
-        model_file = os.path.join(self.model_path, "aqi_model.pkl")
-        scaler_file = os.path.join(self.model_path, "scaler.pkl")
+        """Load trained model"""
+        model_file = os.path.join(self.model_path, "aqi.ubj")
         
         try:
-            self.model = joblib.load(model_file)
-            self.scaler = joblib.load(scaler_file)
+            self.booster = xgb.Booster(model_file=model_file)
             logger.info("Predictor loaded successfully")
             return True
         except Exception as e:
             logger.error(f"Error loading model: {e}")
             return False
     
+    def warmup(self):
+        """Run one dummy inference so the first request doesn't pay setup costs"""
+        if self.booster is None:
+            return
+        
+        try:
+            self.booster.inplace_predict(np.zeros((1, len(FEATURE_ORDER)), dtype=np.float32))
+        except Exception as e:
+            # e.g. a model trained on a different feature set; serve the
+            # trend-based fallback rather than failing startup
+            logger.error(f"Model warmup failed, disabling model: {e}")
+            self.booster = None
+    
+    def start_batcher(self):
+        """Start the background task that batches inference across callers"""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batcher())
+    
+    async def stop_batcher(self):
+        """Stop the batching task; later calls run inference directly"""
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+    
+    async def _infer(self, features: np.ndarray) -> np.ndarray:
+        """Run the model off the event loop, batched with concurrent callers"""
+        if self._batcher is None:
+            return await asyncio.to_thread(self.booster.inplace_predict, features)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+    
+    async def _run_batcher(self):
+        """Drain queued feature matrices into one model call per window"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            matrices = [features for features, _ in batch]
+            try:
+                predicted = await asyncio.to_thread(
+                    self.booster.inplace_predict, np.vstack(matrices)
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            # Hand each caller back its own rows
+            offsets = np.cumsum([len(features) for features in matrices])[:-1]
+            for (_, future), chunk in zip(batch, np.split(predicted, offsets)):
+                if not future.done():
+                    future.set_result(chunk)
+    
     def prepare_prediction_features(
         self, 
         current_data: Dict, 
         forecast_data: Dict,
         historical_data: pd.DataFrame = None
-    ) -> pd.DataFrame:
-        """Prepare features for prediction"""
+    ) -> np.ndarray:
+        """Prepare a single feature row for prediction, ordered as FEATURE_ORDER"""
         
         # Base features from current data and forecast
-        features = {
-            'pm25': current_data.get('pm25', 0),
-            'pm10': current_data.get('pm10', 0),
-            'o3': current_data.get('o3', 0),
-            'no2': current_data.get('no2', 0),
-            'so2': current_data.get('so2', 0),
-            'co': current_data.get('co', 0),
-            'temperature': forecast_data.get('temperature', current_data.get('temperature', 20)),
-            'humidity': forecast_data.get('humidity', current_data.get('humidity', 50)),
-            'wind_speed': forecast_data.get('wind_speed', current_data.get('wind_speed', 5)),
-            'pressure': forecast_data.get('pressure', current_data.get('pressure', 1013)),
-        }
+        pm25 = current_data.get('pm25', 0)
+        pm10 = current_data.get('pm10', 0)
+        temperature = forecast_data.get('temperature', current_data.get('temperature', 20))
+        humidity = forecast_data.get('humidity', current_data.get('humidity', 50))
         
         # Time features
         forecast_time = datetime.utcnow() + timedelta(hours=forecast_data.get('hours_ahead', 24))
-        features['hour'] = forecast_time.hour
-        features['day_of_week'] = forecast_time.weekday()
-        features['month'] = forecast_time.month
-        features['is_weekend'] = 1 if forecast_time.weekday() in [5, 6] else 0
+        day_of_week = forecast_time.weekday()
         
-        # Lag features (using current as lag)
+        # Lag features and rolling averages use current values
         current_aqi = current_data.get('aqi', 50)
-        features['aqi_lag_1'] = current_aqi
-        features['aqi_lag_24'] = current_aqi
-        features['pm25_lag_1'] = features['pm25']
-        features['pm25_lag_24'] = features['pm25']
-        features['pm10_lag_1'] = features['pm10']
-        features['pm10_lag_24'] = features['pm10']
-        features['temperature_lag_1'] = current_data.get('temperature', features['temperature'])
-        features['temperature_lag_24'] = current_data.get('temperature', features['temperature'])
-        features['humidity_lag_1'] = current_data.get('humidity', features['humidity'])
-        features['humidity_lag_24'] = current_data.get('humidity', features['humidity'])
-        
-        # Rolling averages (using current values)
-        features['aqi_rolling_mean_24'] = current_aqi
-        features['pm25_rolling_mean_24'] = features['pm25']
-        features['temperature_rolling_mean_24'] = features['temperature']
-        
-        return pd.DataFrame([features])
+        current_temperature = current_data.get('temperature', temperature)
+        current_humidity = current_data.get('humidity', humidity)
+        
+        x = np.empty((1, len(FEATURE_ORDER)), dtype=np.float32)
+        x[0] = (
+            pm25,
+            pm10,
+            current_data.get('o3', 0),
+            current_data.get('no2', 0),
+            current_data.get('so2', 0),
+            current_data.get('co', 0),
+            temperature,
+            humidity,
+            forecast_data.get('wind_speed', current_data.get('wind_speed', 5)),
+            forecast_data.get('pressure', current_data.get('pressure', 1013)),
+            forecast_time.hour,
+            day_of_week,
+            forecast_time.month,
+            1 if day_of_week in (5, 6) else 0,
+            current_aqi,
+            current_aqi,
+            pm25,
+            pm25,
+            pm10,
+            pm10,
+            current_temperature,
+            current_temperature,
+            current_humidity,
+            current_humidity,
+            current_aqi,
+            pm25,
+            temperature,
+        )
+        
+        return x
     
-    def predict_future_aqi(
+    async def predict_future_aqi(
         self, 
         lat: float, 
         lon: float, 
         city: str,
         hours: List[int] = [24, 48, 72]
     ) -> Dict:
-        """Predict AQI for future time periods"""
+        """Predict AQI for future time periods (read-only, safe to share across requests)"""
         
-        if not self.model or not self.scaler:
+        if self.booster is None:
             logger.error("Model not loaded")
             return None
         
         try:
-            # Get current AQI data
-            current_aqi = self.aqi_service.get_current_aqi(lat, lon)
+            # Get current AQI data and weather forecast concurrently
+            current_aqi, weather_forecast = await asyncio.gather(
+                self.aqi_service.get_current_aqi(lat, lon),
+                self.weather_service.get_forecast(lat, lon, hours=max(hours))
+            )
             if not current_aqi:
                 logger.warning(f"No current AQI data for {city}")
                 current_aqi = {'aqi': 50}  # Default fallback
             
-            # Get weather forecast
-            weather_forecast = self.weather_service.get_forecast(lat, lon, hours=max(hours))
             if not weather_forecast:
                 logger.warning(f"No weather forecast for {city}")
                 return None
             
-            predictions = []
+            forecasts, rows = self._prepare_rows(current_aqi, weather_forecast, hours)
             
-            for hour in hours:
-                # Find closest forecast data point
-                forecast_idx = min(hour // 3, len(weather_forecast) - 1)
-                forecast_data = weather_forecast[forecast_idx].copy()
-                forecast_data['hours_ahead'] = hour
-                
-                # Prepare features
-                features_df = self.prepare_prediction_features(
-                    current_aqi,
-                    forecast_data
-                )
-                
-                # Scale features
-                features_scaled = self.scaler.transform(features_df)
-                
-                # Predict
-                predicted_aqi = self.model.predict(features_scaled)[0]
-                predicted_aqi = max(0, min(500, predicted_aqi))  # Clamp to valid range
-                
-                predictions.append({
-                    'hours': hour,
-                    'timestamp': (datetime.utcnow() + timedelta(hours=hour)).isoformat(),
-                    'predicted_aqi': round(float(predicted_aqi), 1),
-                    'temperature': forecast_data.get('temperature'),
-                    'humidity': forecast_data.get('humidity')
-                })
+            # Predict every horizon in one model call
+            predicted = await self._infer(
+                np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+            )
+            predicted = np.clip(predicted, 0, 500)  # Clamp to valid range
             
-            return {
-                'city': city,
-                'current_aqi': float(current_aqi.get('aqi', 0)),
-                'predictions': predictions,
-                'generated_at': datetime.utcnow().isoformat()
-            }
+            return self._build_result(city, current_aqi, hours, forecasts, predicted)
             
         except Exception as e:
             logger.error(f"Error predicting AQI: {e}")
             return None
     
-    def predict_with_fallback(
+    def _prepare_rows(self, current_aqi: Dict, weather_forecast: List[Dict], hours: List[int]):
+        """Pick the closest forecast point per horizon and build its feature row"""
+        forecasts = []
+        rows = []
+        
+        for hour in hours:
+            # Find closest forecast data point
+            forecast_idx = min(hour // 3, len(weather_forecast) - 1)
+            forecast_data = weather_forecast[forecast_idx].copy()
+            forecast_data['hours_ahead'] = hour
+            
+            forecasts.append(forecast_data)
+            rows.append(self.prepare_prediction_features(current_aqi, forecast_data))
+        
+        return forecasts, rows
+    
+    def _build_result(
         self,
-        lat: float,
-        lon: float,
         city: str,
-        hours: List[int] = [24, 48, 72]
+        current_aqi: Dict,
+        hours: List[int],
+        forecasts: List[Dict],
+        predicted: np.ndarray
     ) -> Dict:
-        """Predict with fallback to simple trend-based prediction"""
-        
-        result = self.predict_future_aqi(lat, lon, city, hours)
-        
-        if result:
-            return result
-        
-        # Fallback: simple trend-based prediction
-        logger.info("Using fallback prediction method")
-        current_aqi_data = self.aqi_service.get_current_aqi(lat, lon)
-        current_aqi = current_aqi_data.get('aqi', 50) if current_aqi_data else 50
+        """Assemble the prediction response for one city"""
+        predictions = [{
+            'hours': hour,
+            'timestamp': (datetime.utcnow() + timedelta(hours=hour)).isoformat(),
+            'predicted_aqi': round(float(predicted_aqi), 1),
+            'temperature': forecast_data.get('temperature'),
+            'humidity': forecast_data.get('humidity')
+        } for hour, forecast_data, predicted_aqi in zip(hours, forecasts, predicted)]
         
+        return {
+            'city': city,
+            'current_aqi': float(current_aqi.get('aqi', 0)),
+            'predictions': predictions,
+            'generated_at': datetime.utcnow().isoformat()
+        }
+    
+    def _fallback_result(self, city: str, current_aqi: float, hours: List[int]) -> Dict:
+        """Simple trend-based prediction used when the model can't run"""
         predictions = []
         for hour in hours:
             # Simple decay model with weather influence
@@ -187,4 +280,78 @@ class AQIPredictor:
             'predictions': predictions,
             'generated_at': datetime.utcnow().isoformat(),
             'fallback': True
-        }
\ No newline at end of file
+        }
+    
+    async def predict_with_fallback(
+        self,
+        lat: float,
+        lon: float,
+        city: str,
+        hours: List[int] = [24, 48, 72]
+    ) -> Dict:
+        """Predict with fallback to simple trend-based prediction"""
+        
+        result = await self.predict_future_aqi(lat, lon, city, hours)
+        
+        if result:
+            return result
+        
+        # Fallback: simple trend-based prediction
+        logger.info("Using fallback prediction method")
+        current_aqi_data = await self.aqi_service.get_current_aqi(lat, lon)
+        current_aqi = current_aqi_data.get('aqi', 50) if current_aqi_data else 50
+        
+        return self._fallback_result(city, current_aqi, hours)
+    
+    async def predict_many(
+        self,
+        locations: List[Tuple[float, float, str]],
+        hours: List[int] = [24, 48, 72]
+    ) -> List[Dict]:
+        """Predict AQI for several cities with one model call"""
+        
+        # Fetch current AQI and forecasts for every city concurrently
+        inputs = await asyncio.gather(*[
+            asyncio.gather(
+                self.aqi_service.get_current_aqi(lat, lon),
+                self.weather_service.get_forecast(lat, lon, hours=max(hours))
+            )
+            for lat, lon, _ in locations
+        ], return_exceptions=True)
+        
+        results = [None] * len(locations)
+        ready = []
+        rows = []
+        
+        for i, ((lat, lon, city), fetched) in enumerate(zip(locations, inputs)):
+            if isinstance(fetched, Exception):
+                logger.error(f"Error fetching prediction inputs for {city}: {fetched}")
+                fetched = (None, None)
+            current_aqi, weather_forecast = fetched
+            current_aqi = current_aqi or {'aqi': 50}  # Default fallback
+            
+            if self.booster is None or not weather_forecast:
+                logger.warning(f"Using fallback prediction for {city}")
+                results[i] = self._fallback_result(city, current_aqi.get('aqi', 50), hours)
+                continue
+            
+            forecasts, city_rows = self._prepare_rows(current_aqi, weather_forecast, hours)
+            ready.append((i, city, current_aqi, forecasts))
+            rows.extend(city_rows)
+        
+        if ready:
+            try:
+                # Predict every (city, horizon) pair in one model call
+                predicted = (await self._infer(
+                    np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
+                )).reshape(len(ready), len(hours))
+                predicted = np.clip(predicted, 0, 500)  # Clamp to valid range
+                
+                for (i, city, current_aqi, forecasts), city_pred in zip(ready, predicted):
+                    results[i] = self._build_result(city, current_aqi, hours, forecasts, city_pred)
+            except Exception as e:
+                logger.error(f"Error predicting AQI: {e}")
+                for i, city, current_aqi, _ in ready:
+                    results[i] = self._fallback_result(city, current_aqi.get('aqi', 50), hours)
+        
+        return results
\ No newline at end of file
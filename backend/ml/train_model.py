@@ -1,9 +1,7 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from xgboost import XGBRegressor
-import joblib
+from sklearn.metrics import r2_score
+import xgboost as xgb
 import os
 from datetime import datetime
 import logging
@@ -15,37 +13,58 @@ class AQIModelTrainer:
         self.model_path = model_path
         self.data_path = data_path
         self.model = None
-        self.scaler = None
         
         # Create models directory if it doesn't exist
         os.makedirs(model_path, exist_ok=True)
     
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Engineer features for model training"""
-        df = df.copy()
+        # Keep each city's history contiguous and in time order
+        df = df.sort_values(['city', 'timestamp'], kind='stable', ignore_index=True)
         
-        # Handle missing values
-        df = df.fillna(method='ffill').fillna(method='bfill')
+        # Handle missing values within each city only; columns a city never
+        # reports (stations often omit so2/co/o3) stay NaN, which XGBoost
+        # handles natively and matches how prediction passes them
+        value_cols = df.columns.drop('city')
+        df[value_cols] = df.groupby('city', sort=False)[value_cols].ffill()
+        df[value_cols] = df.groupby('city', sort=False)[value_cols].bfill()
         
         # Time-based features
-        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
-        df['month'] = pd.to_datetime(df['timestamp']).dt.month
+        ts = pd.to_datetime(df['timestamp'])
+        df['hour'] = ts.dt.hour
+        df['day_of_week'] = ts.dt.dayofweek
+        df['month'] = ts.dt.month
         df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
         
+        # Lags and rolling windows are computed per city so one city's
+        # history never leaks into another's features
+        grp = df.groupby('city', sort=False)
+        
         # Lag features (previous values)
-        for col in ['aqi', 'pm25', 'pm10', 'temperature', 'humidity']:
-            if col in df.columns:
-                df[f'{col}_lag_1'] = df[col].shift(1)
-                df[f'{col}_lag_24'] = df[col].shift(24)
+        lag_cols = [col for col in ['aqi', 'pm25', 'pm10', 'temperature', 'humidity'] if col in df.columns]
+        lag_1 = grp[lag_cols].shift(1)
+        lag_24 = grp[lag_cols].shift(24)
+        for col in lag_cols:
+            df[f'{col}_lag_1'] = lag_1[col]
+            df[f'{col}_lag_24'] = lag_24[col]
         
         # Rolling averages
-        for col in ['aqi', 'pm25', 'temperature']:
-            if col in df.columns:
-                df[f'{col}_rolling_mean_24'] = df[col].rolling(window=24, min_periods=1).mean()
+        rolling_cols = [col for col in ['aqi', 'pm25', 'temperature'] if col in df.columns]
+        rolling_mean = (
+            grp[rolling_cols]
+            .rolling(window=24, min_periods=1)
+            .mean()
+            .reset_index(level=0, drop=True)
+        )
+        for col in rolling_cols:
+            df[f'{col}_rolling_mean_24'] = rolling_mean[col]
         
-        # Drop rows with NaN from lag features
-        df = df.dropna()
+        # Drop rows without a target or AQI history (each city's first rows)
+        df = df.dropna(subset=['aqi', 'aqi_lag_1', 'aqi_lag_24'])
+        
+        # Back to time order so train()'s chronological split holds out the
+        # most recent data rather than the alphabetically last cities
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
         
         return df
     
@@ -73,46 +92,45 @@ class AQIModelTrainer:
         # Filter to existing columns
         feature_cols = [col for col in feature_cols if col in df_prepared.columns]
         
-        X = df_prepared[feature_cols]
-        y = df_prepared[target_col]
+        # Trees are scale-invariant, so features go in unscaled as float32
+        X = np.asarray(df_prepared[feature_cols], dtype=np.float32)
+        y = np.asarray(df_prepared[target_col], dtype=np.float32)
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, shuffle=False
-        )
+        # Chronological split (no shuffling); slices are views, not copies
+        n_test = int(np.ceil(len(X) * 0.2))
+        X_train, X_test = X[:-n_test], X[-n_test:]
+        y_train, y_test = y[:-n_test], y[-n_test:]
         
-        # Scale features
-        logger.info("Scaling features...")
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        # Quantized matrices hold histogram bins instead of a float copy
+        dtrain = xgb.QuantileDMatrix(X_train, label=y_train)
+        dtest = xgb.QuantileDMatrix(X_test, label=y_test, ref=dtrain)
         
         # Train XGBoost model
         logger.info("Training XGBoost model...")
-        self.model = XGBRegressor(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            random_state=42,
-            n_jobs=-1
-        )
-        
-        self.model.fit(
-            X_train_scaled, y_train,
-            eval_set=[(X_test_scaled, y_test)],
-            verbose=False
+        self.model = xgb.train(
+            {
+                'objective': 'reg:squarederror',
+                'tree_method': 'hist',
+                'max_depth': 6,
+                'eta': 0.1,
+                'subsample': 0.8,
+                'colsample_bytree': 0.8,
+                'seed': 42
+            },
+            dtrain,
+            num_boost_round=200,
+            evals=[(dtest, 'test')],
+            verbose_eval=False
         )
         
         # Evaluate
-        train_score = self.model.score(X_train_scaled, y_train)
-        test_score = self.model.score(X_test_scaled, y_test)
+        train_score = r2_score(y_train, self.model.inplace_predict(X_train))
+        test_score = r2_score(y_test, self.model.inplace_predict(X_test))
         
         logger.info(f"Training R² score: {train_score:.4f}")
         logger.info(f"Testing R² score: {test_score:.4f}")
         
-        # Save model and scaler
+        # Save model
         self.save_model()
         
         return {
@@ -123,25 +141,20 @@ class AQIModelTrainer:
         }
     
     def save_model(self):
-        """Save trained model and scaler"""
-        model_file = os.path.join(self.model_path, "aqi_model.pkl")
-        scaler_file = os.path.join(self.model_path, "scaler.pkl")
+        """Save trained model in XGBoost's native UBJSON format"""
+        model_file = os.path.join(self.model_path, "aqi.ubj")
         
-        joblib.dump(self.model, model_file)
-        joblib.dump(self.scaler, scaler_file)
+        self.model.save_model(model_file)
         
         logger.info(f"Model saved to {model_file}")
-        logger.info(f"Scaler saved to {scaler_file}")
     
     def load_model(self):
-        """Load trained model and scaler"""
-        model_file = os.path.join(self.model_path, "aqi_model.pkl")
-        scaler_file = os.path.join(self.model_path, "scaler.pkl")
-        
-        if os.path.exists(model_file) and os.path.exists(scaler_file):
-            self.model = joblib.load(model_file)
-            self.scaler = joblib.load(scaler_file)
-            logger.info("Model and scaler loaded successfully")
+        """Load trained model"""
+        model_file = os.path.join(self.model_path, "aqi.ubj")
+        
+        if os.path.exists(model_file):
+            self.model = xgb.Booster(model_file=model_file)
+            logger.info("Model loaded successfully")
             return True
         else:
             logger.warning("Model files not found")
@@ -149,20 +162,21 @@ class AQIModelTrainer:
 
 if __name__ == "__main__":
     # Example usage for training
-    from database import SessionLocal
+    import asyncio
+    from database import AsyncSessionLocal
     from data_collector import DataCollector
     
-    db = SessionLocal()
-    collector = DataCollector(db)
+    async def load_training_data():
+        async with AsyncSessionLocal() as db:
+            collector = DataCollector(db)
+            return await collector.get_training_data(days=90)
     
     # Get training data
-    df = collector.get_training_data(days=90)
+    df = asyncio.run(load_training_data())
     
     if len(df) > 0:
         trainer = AQIModelTrainer()
         results = trainer.train(df)
         print(f"Training complete: {results}")
     else:
-        print("No data available for training")
-    
-    db.close()
\ No newline at end of file
+        print("No data available for training")
\ No newline at end of file
@@ -1,8 +1,11 @@
-from pydantic import BaseModel
+from dataclasses import dataclass
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from datetime import datetime
 
 class AQIData(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     city: str
     country: str
     lat: float
@@ -19,9 +22,6 @@ class AQIData(BaseModel):
     wind_speed: Optional[float] = None
     pressure: Optional[float] = None
     timestamp: datetime
-    
-    class Config:
-        from_attributes = True
 
 class AQIPredictionResponse(BaseModel):
     city: str
@@ -38,6 +38,17 @@ class HistoricalAQIResponse(BaseModel):
     city: str
     data: List[dict]
     
+@dataclass(frozen=True, slots=True)
+class AQIRow:
+    """Lightweight historical data point, serialized directly by orjson"""
+    timestamp: datetime
+    aqi: float
+    category: Optional[str]
+    pm25: Optional[float]
+    pm10: Optional[float]
+    temperature: Optional[float]
+    humidity: Optional[float]
+    
 class HealthTip(BaseModel):
     category: str
     tips: List[str]
\ No newline at end of file
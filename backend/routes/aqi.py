@@ -1,36 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from database import get_db, AQIRecord
-from models.schemas import AQIPredictionResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, AsyncSessionLocal, AQIRecord
+from config import settings
+from dependencies import get_weather_service, get_aqi_service, get_predictor
+from models.schemas import AQIPredictionResponse, AQIRow
 from ml.predict import AQIPredictor
-from services.aqi_service import get_aqi_category, get_health_tips
+from services.aqi_service import AQIService, get_aqi_category, get_aqi_categories, get_health_tips
 from services.weather_service import WeatherService
+from services import cache
 from datetime import datetime, timedelta
 from typing import List
+import asyncio
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/aqi", tags=["AQI"])
 
-predictor = AQIPredictor()
-weather_service = WeatherService()
 
 @router.get("/current/{city}")
-async def get_current_aqi(city: str, db: Session = Depends(get_db)):
+async def get_current_aqi(
+    city: str,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    weather_service: WeatherService = Depends(get_weather_service),
+    aqi_service: AQIService = Depends(get_aqi_service)
+):
     """Get current AQI for a city"""
     try:
         # Get coordinates
-        location = weather_service.geocode_city(city)
+        location = await weather_service.geocode_city(city)
         if not location:
             raise HTTPException(status_code=404, detail="City not found")
         
-        # Get latest record from database
-        recent_record = db.query(AQIRecord).filter(
-            AQIRecord.city == location['city']
-        ).order_by(AQIRecord.timestamp.desc()).first()
+        cache_key = cache.current_aqi_key(location['city'])
+        cached = await cache.get_json(cache_key)
+        if cached:
+            response.headers["X-Cache"] = "HIT"
+            return cached
+        response.headers["X-Cache"] = "MISS"
+        
+        # Get latest record from the last hour
+        result = await db.execute(
+            select(AQIRecord)
+            .where(
+                AQIRecord.city == location['city'],
+                AQIRecord.timestamp >= datetime.utcnow() - timedelta(hours=1)
+            )
+            .order_by(AQIRecord.timestamp.desc())
+            .limit(1)
+        )
+        recent_record = result.scalars().first()
         
-        if recent_record and (datetime.utcnow() - recent_record.timestamp).seconds < 3600:
-            return {
+        if recent_record:
+            current = {
                 "city": recent_record.city,
                 "country": recent_record.country,
                 "aqi": recent_record.aqi,
@@ -51,16 +76,16 @@ async def get_current_aqi(city: str, db: Session = Depends(get_db)):
                 },
                 "timestamp": recent_record.timestamp.isoformat()
             }
+            await cache.set_json(cache_key, current, settings.CURRENT_AQI_CACHE_TTL)
+            return current
         
         # Fallback to live API
-        from services.aqi_service import AQIService
-        aqi_service = AQIService()
-        aqi_data = aqi_service.get_aqi_by_city(city)
+        aqi_data = await aqi_service.get_aqi_by_city(city)
         
         if not aqi_data:
             raise HTTPException(status_code=404, detail="AQI data not available")
         
-        return {
+        current = {
             "city": aqi_data.get('city', city),
             "aqi": aqi_data.get('aqi'),
             "category": get_aqi_category(aqi_data.get('aqi')),
@@ -74,6 +99,8 @@ async def get_current_aqi(city: str, db: Session = Depends(get_db)):
             },
             "timestamp": datetime.utcnow().isoformat()
         }
+        await cache.set_json(cache_key, current, settings.CURRENT_AQI_CACHE_TTL)
+        return current
         
     except HTTPException:
         raise
@@ -85,7 +112,9 @@ async def get_current_aqi(city: str, db: Session = Depends(get_db)):
 async def predict_aqi(
     city: str,
     hours: str = Query("24,48,72", description="Comma-separated prediction hours"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    weather_service: WeatherService = Depends(get_weather_service),
+    predictor: AQIPredictor = Depends(get_predictor)
 ):
     """Predict future AQI for a city"""
     try:
@@ -93,12 +122,12 @@ async def predict_aqi(
         hour_list = [int(h.strip()) for h in hours.split(",")]
         
         # Get coordinates
-        location = weather_service.geocode_city(city)
+        location = await weather_service.geocode_city(city)
         if not location:
             raise HTTPException(status_code=404, detail="City not found")
         
         # Get prediction
-        prediction_result = predictor.predict_with_fallback(
+        prediction_result = await predictor.predict_with_fallback(
             location['lat'],
             location['lon'],
             location['city'],
@@ -125,39 +154,112 @@ async def predict_aqi(
         logger.error(f"Error predicting AQI: {e}")
         raise HTTPException(status_code=500, detail="Prediction failed")
 
+@router.get("/predict")
+async def predict_aqi_many(
+    cities: str = Query(..., description="Comma-separated city names"),
+    hours: str = Query("24,48,72", description="Comma-separated prediction hours"),
+    weather_service: WeatherService = Depends(get_weather_service),
+    predictor: AQIPredictor = Depends(get_predictor)
+):
+    """Predict future AQI for multiple cities"""
+    try:
+        city_list = [c.strip() for c in cities.split(",")]
+        
+        if len(city_list) > 10:
+            raise HTTPException(status_code=400, detail="Maximum 10 cities allowed")
+        
+        # Parse hours
+        hour_list = [int(h.strip()) for h in hours.split(",")]
+        
+        # Geocode all cities concurrently
+        locations = await asyncio.gather(*[
+            weather_service.geocode_city(city) for city in city_list
+        ])
+        locations = [
+            (location['lat'], location['lon'], location['city'])
+            for location in locations if location
+        ]
+        
+        prediction_results = await predictor.predict_many(locations, hour_list)
+        
+        results = [{
+            "city": prediction_result['city'],
+            "current_aqi": prediction_result['current_aqi'],
+            "aqi_category": get_aqi_category(prediction_result['current_aqi']),
+            "predictions": prediction_result['predictions'],
+            "generated_at": prediction_result['generated_at']
+        } for prediction_result in prediction_results]
+        
+        return {
+            "cities": results,
+            "count": len(results)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting AQI: {e}")
+        raise HTTPException(status_code=500, detail="Prediction failed")
+
 @router.get("/historical/{city}")
 async def get_historical_aqi(
     city: str,
     days: int = Query(7, ge=1, le=90),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Stream data points as NDJSON"),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get historical AQI data for a city"""
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        records = db.query(AQIRecord).filter(
+        filters = (
             AQIRecord.city.ilike(f"%{city}%"),
             AQIRecord.timestamp >= cutoff_date
-        ).order_by(AQIRecord.timestamp).all()
+        )
+        
+        if stream:
+            found = await db.scalar(select(AQIRecord.id).where(*filters).limit(1))
+            if found is None:
+                raise HTTPException(status_code=404, detail="No historical data found")
+            
+            return StreamingResponse(
+                _stream_historical(filters),
+                media_type="application/x-ndjson"
+            )
         
-        if not records:
+        # Plain column rows, no ORM objects or identity map
+        result = await db.execute(
+            select(
+                AQIRecord.timestamp,
+                AQIRecord.aqi,
+                AQIRecord.pm25,
+                AQIRecord.pm10,
+                AQIRecord.temperature,
+                AQIRecord.humidity,
+                AQIRecord.city,
+                AQIRecord.country
+            )
+            .where(*filters)
+            .order_by(AQIRecord.timestamp)
+        )
+        rows = result.all()
+        
+        if not rows:
             raise HTTPException(status_code=404, detail="No historical data found")
         
-        data = [{
-            "timestamp": r.timestamp.isoformat(),
-            "aqi": r.aqi,
-            "pm25": r.pm25,
-            "pm10": r.pm10,
-            "temperature": r.temperature,
-            "humidity": r.humidity
-        } for r in records]
+        categories = get_aqi_categories([row.aqi for row in rows])
         
-        return {
-            "city": records[0].city,
-            "country": records[0].country,
+        data = [
+            AQIRow(ts, aqi, category, pm25, pm10, temperature, humidity)
+            for (ts, aqi, pm25, pm10, temperature, humidity, _, _), category in zip(rows, categories)
+        ]
+        
+        # orjson serializes the dataclasses directly, skipping jsonable_encoder
+        return ORJSONResponse({
+            "city": rows[0].city,
+            "country": rows[0].country,
             "data": data,
             "count": len(data)
-        }
+        })
         
     except HTTPException:
         raise
@@ -165,10 +267,35 @@ async def get_historical_aqi(
         logger.error(f"Error fetching historical data: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def _stream_historical(filters):
+    """Yield historical data points as NDJSON straight off the DB cursor"""
+    # The request's session is closed before the body streams, so use our own
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(
+                AQIRecord.timestamp,
+                AQIRecord.aqi,
+                AQIRecord.pm25,
+                AQIRecord.pm10,
+                AQIRecord.temperature,
+                AQIRecord.humidity
+            )
+            .where(*filters)
+            .order_by(AQIRecord.timestamp)
+            .execution_options(yield_per=500)
+        )
+        async for rows in result.partitions():
+            categories = get_aqi_categories([row.aqi for row in rows])
+            yield b"".join(
+                orjson.dumps(AQIRow(ts, aqi, category, pm25, pm10, temperature, humidity)) + b"\n"
+                for (ts, aqi, pm25, pm10, temperature, humidity), category in zip(rows, categories)
+            )
+
 @router.get("/compare")
 async def compare_cities(
     cities: str = Query(..., description="Comma-separated city names"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    weather_service: WeatherService = Depends(get_weather_service)
 ):
     """Compare current AQI across multiple cities"""
     try:
@@ -177,25 +304,31 @@ async def compare_cities(
         if len(city_list) > 10:
             raise HTTPException(status_code=400, detail="Maximum 10 cities allowed")
         
-        results = []
+        # Geocode all cities concurrently
+        locations = await asyncio.gather(*[
+            weather_service.geocode_city(city) for city in city_list
+        ])
+        names = list(dict.fromkeys(location['city'] for location in locations if location))
         
-        for city in city_list:
-            location = weather_service.geocode_city(city)
-            if not location:
-                continue
-            
-            recent_record = db.query(AQIRecord).filter(
-                AQIRecord.city == location['city']
-            ).order_by(AQIRecord.timestamp.desc()).first()
-            
-            if recent_record:
-                results.append({
-                    "city": recent_record.city,
-                    "country": recent_record.country,
-                    "aqi": recent_record.aqi,
-                    "category": get_aqi_category(recent_record.aqi),
-                    "timestamp": recent_record.timestamp.isoformat()
-                })
+        if not names:
+            return {"cities": [], "count": 0}
+        
+        # Latest record per city in a single DISTINCT ON query
+        result = await db.execute(
+            select(AQIRecord)
+            .where(AQIRecord.city.in_(names))
+            .order_by(AQIRecord.city, AQIRecord.timestamp.desc())
+            .distinct(AQIRecord.city)
+        )
+        latest = {record.city: record for record in result.scalars()}
+        
+        results = [{
+            "city": recent_record.city,
+            "country": recent_record.country,
+            "aqi": recent_record.aqi,
+            "category": get_aqi_category(recent_record.aqi),
+            "timestamp": recent_record.timestamp.isoformat()
+        } for recent_record in (latest.get(name) for name in names) if recent_record]
         
         return {
             "cities": results,
@@ -1,25 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db, Location
+from dependencies import get_weather_service
 from services.weather_service import WeatherService
-from services.aqi_service import AQIService
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/locations", tags=["Locations"])
 
-weather_service = WeatherService()
-aqi_service = AQIService()
-
 @router.get("/search")
 async def search_locations(
     q: str = Query(..., min_length=2, description="Search query"),
-    limit: int = Query(10, ge=1, le=50)
+    limit: int = Query(10, ge=1, le=50),
+    weather_service: WeatherService = Depends(get_weather_service)
 ):
     """Search for cities with autocomplete"""
     try:
         # Search using geocoding API
-        location = weather_service.geocode_city(q)
+        location = await weather_service.geocode_city(q)
         
         if location:
             return {
@@ -40,12 +41,13 @@ async def search_locations(
         raise HTTPException(status_code=500, detail="Search failed")
 
 @router.get("/popular")
-async def get_popular_locations(db: Session = Depends(get_db)):
+async def get_popular_locations(db: AsyncSession = Depends(get_db)):
     """Get list of popular monitored cities"""
     try:
-        locations = db.query(Location).filter(
-            Location.is_active == 1
-        ).limit(20).all()
+        result = await db.execute(
+            select(Location).where(Location.is_active == 1).limit(20)
+        )
+        locations = result.scalars().all()
         
         results = [{
             "city": loc.city,
@@ -67,30 +69,23 @@ async def get_popular_locations(db: Session = Depends(get_db)):
 @router.post("/add")
 async def add_location(
     city: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    weather_service: WeatherService = Depends(get_weather_service)
 ):
     """Add a new location to monitor"""
     try:
         # Geocode city
-        location_data = weather_service.geocode_city(city)
+        location_data = await weather_service.geocode_city(city)
         if not location_data:
             raise HTTPException(status_code=404, detail="City not found")
         
         # Check if already exists
-        existing = db.query(Location).filter(
-            Location.city == location_data['city']
-        ).first()
+        existing_id = await db.scalar(
+            select(Location.id).where(Location.city == location_data['city']).limit(1)
+        )
         
-        if existing:
-            return {
-                "message": "Location already exists",
-                "location": {
-                    "city": existing.city,
-                    "country": existing.country,
-                    "lat": existing.lat,
-                    "lon": existing.lon
-                }
-            }
+        if existing_id is not None:
+            return await _existing_location(db, existing_id)
         
         # Add new location
         new_location = Location(
@@ -102,8 +97,15 @@ async def add_location(
         )
         
         db.add(new_location)
-        db.commit()
-        db.refresh(new_location)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Lost the race to a concurrent insert of the same city
+            await db.rollback()
+            existing_id = await db.scalar(
+                select(Location.id).where(Location.city == location_data['city'])
+            )
+            return await _existing_location(db, existing_id)
         
         return {
             "message": "Location added successfully",
@@ -119,38 +121,62 @@ async def add_location(
         raise
     except Exception as e:
         logger.error(f"Error adding location: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to add location")
 
+async def _existing_location(db: AsyncSession, location_id: int) -> dict:
+    """Response for a location that is already monitored"""
+    existing = await db.get(Location, location_id)
+    return {
+        "message": "Location already exists",
+        "location": {
+            "city": existing.city,
+            "country": existing.country,
+            "lat": existing.lat,
+            "lon": existing.lon
+        }
+    }
+
 @router.get("/nearby")
 async def get_nearby_locations(
     lat: float = Query(..., ge=-90, le=90),
     lon: float = Query(..., ge=-180, le=180),
     radius_km: int = Query(50, ge=1, le=500),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Find nearby monitored locations"""
     try:
-        # Simple distance calculation (Haversine would be more accurate)
-        from sqlalchemy import func
-        
-        # Approximate degree to km conversion
-        lat_range = radius_km / 111.0  # 1 degree lat ≈ 111 km
-        lon_range = radius_km / (111.0 * abs(func.cos(func.radians(lat))))
-        
-        locations = db.query(Location).filter(
-            Location.is_active == 1,
-            Location.lat.between(lat - lat_range, lat + lat_range),
-            Location.lon.between(lon - lon_range, lon + lon_range)
-        ).limit(20).all()
+        # Bounding box prefilter (1 degree lat ≈ 111 km), served by the
+        # (is_active, lat, lon) index
+        lat_range = radius_km / 111.0
+        lon_range = radius_km / (111.0 * max(0.01, math.cos(math.radians(lat))))
+        
+        # Great-circle distance in km; the acos argument is clamped
+        # against rounding just above 1
+        distance = 6371.0 * func.acos(func.least(1.0,
+            math.cos(math.radians(lat))
+            * func.cos(func.radians(Location.lat))
+            * func.cos(func.radians(Location.lon) - math.radians(lon))
+            + math.sin(math.radians(lat)) * func.sin(func.radians(Location.lat))
+        ))
+        
+        result = await db.execute(
+            select(Location, distance.label("distance_km")).where(
+                Location.is_active == 1,
+                Location.lat.between(lat - lat_range, lat + lat_range),
+                Location.lon.between(lon - lon_range, lon + lon_range),
+                distance <= radius_km
+            ).order_by(distance).limit(20)
+        )
         
         results = [{
             "city": loc.city,
             "country": loc.country,
             "lat": loc.lat,
             "lon": loc.lon,
+            "distance_km": round(distance_km, 1),
             "display_name": f"{loc.city}, {loc.country}"
-        } for loc in locations]
+        } for loc, distance_km in result.all()]
         
         return {
             "locations": results,
@@ -1,24 +1,42 @@
-import requests
+import httpx
+import numpy as np
+from bisect import bisect_left
 from typing import Optional, Dict
 from config import settings
+from services.cache import cached_get
+from services.http import fetch_json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Pollutants reported in WAQI's "iaqi" block
+_POLLUTANTS = ("pm25", "pm10", "o3", "no2", "so2", "co")
+
 class AQIService:
-    def __init__(self):
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
         self.waqi_key = settings.WAQI_API_KEY
         self.base_url = "https://api.waqi.info"
     
-    def get_current_aqi(self, lat: float, lon: float) -> Optional[Dict]:
+    async def get_current_aqi(
+        self, lat: float, lon: float
+    ) -> Optional[Dict]:
+        """Get current AQI data, served from cache when fresh"""
+        return await cached_get(
+            f"aqi:waqi:{lat:.2f}:{lon:.2f}",
+            settings.AQI_CACHE_TTL,
+            lambda: self._fetch_current_aqi(lat, lon)
+        )
+    
+    async def _fetch_current_aqi(
+        self, lat: float, lon: float
+    ) -> Optional[Dict]:
         """Fetch current AQI data from WAQI"""
         try:
             url = f"{self.base_url}/feed/geo:{lat};{lon}/"
             params = {"token": self.waqi_key}
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             if data["status"] == "ok":
                 result = {
@@ -29,12 +47,7 @@ class AQIService:
                 # Extract pollutant data
                 iaqi = data["data"].get("iaqi", {})
                 result.update({
-                    "pm25": iaqi.get("pm25", {}).get("v"),
-                    "pm10": iaqi.get("pm10", {}).get("v"),
-                    "o3": iaqi.get("o3", {}).get("v"),
-                    "no2": iaqi.get("no2", {}).get("v"),
-                    "so2": iaqi.get("so2", {}).get("v"),
-                    "co": iaqi.get("co", {}).get("v")
+                    p: iaqi[p]["v"] if p in iaqi else None for p in _POLLUTANTS
                 })
                 
                 return result
@@ -43,15 +56,13 @@ class AQIService:
             logger.error(f"Error fetching AQI data: {e}")
             return None
     
-    def get_aqi_by_city(self, city: str) -> Optional[Dict]:
+    async def get_aqi_by_city(self, city: str) -> Optional[Dict]:
         """Fetch AQI data by city name"""
         try:
             url = f"{self.base_url}/feed/{city}/"
             params = {"token": self.waqi_key}
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             if data["status"] == "ok":
                 result = {
@@ -63,12 +74,7 @@ class AQIService:
                 
                 iaqi = data["data"].get("iaqi", {})
                 result.update({
-                    "pm25": iaqi.get("pm25", {}).get("v"),
-                    "pm10": iaqi.get("pm10", {}).get("v"),
-                    "o3": iaqi.get("o3", {}).get("v"),
-                    "no2": iaqi.get("no2", {}).get("v"),
-                    "so2": iaqi.get("so2", {}).get("v"),
-                    "co": iaqi.get("co", {}).get("v")
+                    p: iaqi[p]["v"] if p in iaqi else None for p in _POLLUTANTS
                 })
                 
                 return result
@@ -77,15 +83,13 @@ class AQIService:
             logger.error(f"Error fetching AQI by city: {e}")
             return None
     
-    def search_cities(self, query: str) -> list:
+    async def search_cities(self, query: str) -> list:
         """Search for cities with AQI stations"""
         try:
             url = f"{self.base_url}/search/"
             params = {"token": self.waqi_key, "keyword": query}
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             if data["status"] == "ok":
                 return [
@@ -101,61 +105,65 @@ class AQIService:
             logger.error(f"Error searching cities: {e}")
             return []
 
+# Upper AQI bound of each category; anything above the last is Hazardous
+_THRESHOLDS = (50, 100, 150, 200, 300)
+_LABELS = (
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous"
+)
+_HEALTH_TIPS = (
+    (
+        "Air quality is excellent. Perfect for outdoor activities!",
+        "Enjoy your time outside with no restrictions.",
+        "Great day for exercise and outdoor sports."
+    ),
+    (
+        "Air quality is acceptable for most people.",
+        "Unusually sensitive individuals should consider limiting prolonged outdoor exertion.",
+        "Good day for outdoor activities with minor precautions."
+    ),
+    (
+        "Sensitive groups should reduce prolonged outdoor exertion.",
+        "Children and adults with respiratory issues should take breaks during outdoor activities.",
+        "Consider wearing a mask if you're in a sensitive group."
+    ),
+    (
+        "Everyone should reduce prolonged outdoor exertion.",
+        "Wear a mask when going outside.",
+        "Keep windows closed and use air purifiers indoors.",
+        "Reschedule outdoor activities if possible."
+    ),
+    (
+        "Avoid all outdoor physical activities.",
+        "Everyone should wear N95 masks outdoors.",
+        "Keep windows and doors closed.",
+        "Use HEPA air purifiers indoors.",
+        "Sensitive groups should remain indoors."
+    ),
+    (
+        "Health alert: Stay indoors and avoid all outdoor activities.",
+        "Use N95 or higher-grade masks if you must go outside.",
+        "Seal windows and doors. Use multiple air purifiers.",
+        "Seek medical attention if you experience symptoms.",
+        "Follow local emergency guidelines."
+    )
+)
+
 def get_aqi_category(aqi: float) -> str:
     """Get AQI category and color"""
-    if aqi <= 50:
-        return "Good"
-    elif aqi <= 100:
-        return "Moderate"
-    elif aqi <= 150:
-        return "Unhealthy for Sensitive Groups"
-    elif aqi <= 200:
-        return "Unhealthy"
-    elif aqi <= 300:
-        return "Very Unhealthy"
-    else:
-        return "Hazardous"
+    return _LABELS[bisect_left(_THRESHOLDS, aqi)]
+
+def get_aqi_categories(aqi_values) -> list:
+    """Get AQI categories for many values at once (None where AQI is missing)"""
+    aqi = np.asarray(aqi_values, dtype=float)
+    labels = np.array(_LABELS, dtype=object)[np.searchsorted(_THRESHOLDS, aqi)]
+    labels[np.isnan(aqi)] = None
+    return labels.tolist()
 
 def get_health_tips(aqi: float) -> list:
     """Get health recommendations based on AQI"""
-    if aqi <= 50:
-        return [
-            "Air quality is excellent. Perfect for outdoor activities!",
-            "Enjoy your time outside with no restrictions.",
-            "Great day for exercise and outdoor sports."
-        ]
-    elif aqi <= 100:
-        return [
-            "Air quality is acceptable for most people.",
-            "Unusually sensitive individuals should consider limiting prolonged outdoor exertion.",
-            "Good day for outdoor activities with minor precautions."
-        ]
-    elif aqi <= 150:
-        return [
-            "Sensitive groups should reduce prolonged outdoor exertion.",
-            "Children and adults with respiratory issues should take breaks during outdoor activities.",
-            "Consider wearing a mask if you're in a sensitive group."
-        ]
-    elif aqi <= 200:
-        return [
-            "Everyone should reduce prolonged outdoor exertion.",
-            "Wear a mask when going outside.",
-            "Keep windows closed and use air purifiers indoors.",
-            "Reschedule outdoor activities if possible."
-        ]
-    elif aqi <= 300:
-        return [
-            "Avoid all outdoor physical activities.",
-            "Everyone should wear N95 masks outdoors.",
-            "Keep windows and doors closed.",
-            "Use HEPA air purifiers indoors.",
-            "Sensitive groups should remain indoors."
-        ]
-    else:
-        return [
-            "Health alert: Stay indoors and avoid all outdoor activities.",
-            "Use N95 or higher-grade masks if you must go outside.",
-            "Seal windows and doors. Use multiple air purifiers.",
-            "Seek medical attention if you experience symptoms.",
-            "Follow local emergency guidelines."
-        ]
\ No newline at end of file
+    return list(_HEALTH_TIPS[bisect_left(_THRESHOLDS, aqi)])
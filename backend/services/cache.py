@@ -0,0 +1,76 @@
+import asyncio
+import orjson
+import redis.asyncio as redis
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+client = redis.Redis.from_url(
+    settings.REDIS_URL,
+    socket_connect_timeout=1,
+    socket_timeout=1
+)
+
+# Upstream fetches in progress, so concurrent misses on a key share one call
+_inflight: Dict[str, asyncio.Task] = {}
+
+async def get_json(key: str) -> Optional[Any]:
+    """Return the cached value for key, or None on a miss"""
+    try:
+        val = await client.get(key)
+        if val:
+            return orjson.loads(val)
+    except Exception as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+    return None
+
+async def set_json(key: str, val: Any, ttl: int):
+    """Cache val under key for ttl seconds"""
+    try:
+        await client.set(key, orjson.dumps(val), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+async def delete(*keys: str):
+    """Invalidate the given keys"""
+    if not keys:
+        return
+    try:
+        await client.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Cache delete failed for {keys}: {e}")
+
+async def cached_get(key: str, ttl: int, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached value for key, or fetch it and cache it for ttl seconds"""
+    val = await get_json(key)
+    if val is not None:
+        return val
+    
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_and_set(key, ttl, fetch))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # Shielded so one cancelled caller doesn't abort the fetch for the others
+    return await asyncio.shield(task)
+
+async def _fetch_and_set(key: str, ttl: int, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Fetch a value and cache it for ttl seconds"""
+    val = await fetch()
+    
+    # Failed fetches return None and are retried on the next call
+    if val is not None:
+        await set_json(key, val, ttl)
+    
+    return val
+
+def current_aqi_key(city: str) -> str:
+    """Cache key for a city's current AQI response"""
+    return f"aqi:cur:{city.lower()}"
+
+async def close():
+    """Close the Redis connection pool"""
+    await client.aclose()
@@ -0,0 +1,41 @@
+import httpx
+import orjson
+from typing import Any, Dict
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
+
+def create_client() -> httpx.AsyncClient:
+    """Pooled keep-alive HTTP client for the external API services"""
+    return httpx.AsyncClient(
+        # Retries failed connection attempts only; see fetch_json for responses.
+        # Pool limits must live on the transport: the client ignores its own
+        # limits= when a custom transport is given
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=32)
+        ),
+        timeout=httpx.Timeout(10.0, connect=2.0, read=8.0)
+    )
+
+def _is_transient(e: BaseException) -> bool:
+    """Read/write/pool timeouts and upstream 5xx responses are worth retrying"""
+    # Connect timeouts are already retried by the transport
+    if isinstance(e, (httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+
+@retry(
+    retry=retry_if_exception(_is_transient),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.2, max=2),
+    reraise=True
+)
+async def fetch_json(client: httpx.AsyncClient, url: str, params: Dict) -> Any:
+    """GET url and decode the JSON body, retrying transient failures"""
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
@@ -1,16 +1,55 @@
-import requests
+import httpx
+import time
+from collections import OrderedDict
 from typing import Optional, Dict
 from config import settings
+from services.cache import cached_get, get_json, set_json
+from services.http import fetch_json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Recent "city not found" results (city -> expiry), most recent last
+_GEOCODE_MISSES: "OrderedDict[str, float]" = OrderedDict()
+_GEOCODE_MISSES_MAX = 1024
+
+def _is_known_miss(key: str) -> bool:
+    """Whether geocoding key recently found no city"""
+    expires = _GEOCODE_MISSES.get(key)
+    if expires is None:
+        return False
+    if expires < time.monotonic():
+        del _GEOCODE_MISSES[key]
+        return False
+    _GEOCODE_MISSES.move_to_end(key)
+    return True
+
+def _remember_miss(key: str):
+    """Record that geocoding key found no city"""
+    _GEOCODE_MISSES[key] = time.monotonic() + settings.GEOCODE_MISS_TTL
+    _GEOCODE_MISSES.move_to_end(key)
+    if len(_GEOCODE_MISSES) > _GEOCODE_MISSES_MAX:
+        _GEOCODE_MISSES.popitem(last=False)
+
 class WeatherService:
-    def __init__(self):
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
         self.api_key = settings.OPENWEATHER_API_KEY
         self.base_url = "https://api.openweathermap.org/data/2.5"
     
-    def get_current_weather(self, lat: float, lon: float) -> Optional[Dict]:
+    async def get_current_weather(
+        self, lat: float, lon: float
+    ) -> Optional[Dict]:
+        """Get current weather data, served from cache when fresh"""
+        return await cached_get(
+            f"weather:owm:{lat:.2f}:{lon:.2f}",
+            settings.WEATHER_CACHE_TTL,
+            lambda: self._fetch_current_weather(lat, lon)
+        )
+    
+    async def _fetch_current_weather(
+        self, lat: float, lon: float
+    ) -> Optional[Dict]:
         """Fetch current weather data from OpenWeatherMap"""
         try:
             url = f"{self.base_url}/weather"
@@ -21,9 +60,7 @@ class WeatherService:
                 "units": "metric"
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             return {
                 "temperature": data["main"]["temp"],
@@ -36,7 +73,19 @@ class WeatherService:
             logger.error(f"Error fetching weather data: {e}")
             return None
     
-    def get_forecast(self, lat: float, lon: float, hours: int = 72) -> Optional[list]:
+    async def get_forecast(
+        self, lat: float, lon: float, hours: int = 72
+    ) -> Optional[list]:
+        """Get weather forecast data, served from cache when fresh"""
+        return await cached_get(
+            f"forecast:owm:{lat:.2f}:{lon:.2f}:{hours}",
+            settings.FORECAST_CACHE_TTL,
+            lambda: self._fetch_forecast(lat, lon, hours)
+        )
+    
+    async def _fetch_forecast(
+        self, lat: float, lon: float, hours: int = 72
+    ) -> Optional[list]:
         """Fetch weather forecast data"""
         try:
             url = f"{self.base_url}/forecast"
@@ -48,9 +97,7 @@ class WeatherService:
                 "cnt": min(hours // 3, 40)  # API returns data in 3-hour intervals
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             forecasts = []
             for item in data["list"]:
@@ -67,8 +114,25 @@ class WeatherService:
             logger.error(f"Error fetching weather forecast: {e}")
             return None
     
-    def geocode_city(self, city: str) -> Optional[Dict]:
-        """Get coordinates for a city name"""
+    async def geocode_city(self, city: str) -> Optional[Dict]:
+        """Get coordinates for a city name, served from cache when known"""
+        key = city.strip().lower()
+        if _is_known_miss(key):
+            return None
+        
+        return await cached_get(
+            f"geo:{key}",
+            settings.GEOCODE_CACHE_TTL,
+            lambda: self._geocode_city(city, key)
+        )
+    
+    async def _geocode_city(self, city: str, key: str) -> Optional[Dict]:
+        """Look up coordinates for a city name on OpenWeatherMap"""
+        # Unknown cities are remembered so repeated typos skip the API
+        if await get_json(f"geo:neg:{key}"):
+            _remember_miss(key)
+            return None
+        
         try:
             url = "http://api.openweathermap.org/geo/1.0/direct"
             params = {
@@ -77,9 +141,7 @@ class WeatherService:
                 "appid": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = await fetch_json(self.client, url, params)
             
             if data:
                 return {
@@ -88,6 +150,9 @@ class WeatherService:
                     "lat": data[0]["lat"],
                     "lon": data[0]["lon"]
                 }
+            
+            _remember_miss(key)
+            await set_json(f"geo:neg:{key}", True, settings.GEOCODE_MISS_TTL)
             return None
         except Exception as e:
             logger.error(f"Error geocoding city: {e}")
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from ml.train_model import AQIModelTrainer
+
+def make_frame(hours=40):
+    """Two interleaved cities; city B never reports o3"""
+    rows = []
+    start = pd.Timestamp('2024-01-01')
+    for i in range(hours):
+        for city, base in (('A', 0.0), ('B', 1000.0)):
+            rows.append({
+                'city': city,
+                'aqi': base + i,
+                'pm25': base + i,
+                'pm10': 1.0, 'o3': np.nan if city == 'B' else 5.0,
+                'no2': 1.0, 'so2': 1.0, 'co': 1.0,
+                'temperature': 20.0, 'humidity': 50.0,
+                'wind_speed': 1.0, 'pressure': 1010.0,
+                'timestamp': start + pd.Timedelta(hours=i)
+            })
+    return pd.DataFrame(rows)
+
+def test_prepare_features_lags_stay_within_city(tmp_path):
+    df = AQIModelTrainer(model_path=str(tmp_path)).prepare_features(make_frame())
+    
+    # The first 24 hours of each city have no aqi_lag_24 and are dropped
+    assert df.groupby('city').size().to_dict() == {'A': 16, 'B': 16}
+    
+    for city, base in (('A', 0.0), ('B', 1000.0)):
+        rows = df[df['city'] == city]
+        assert rows['aqi'].iloc[0] == base + 24
+        assert (rows['aqi_lag_1'] == rows['aqi'] - 1).all()
+        assert (rows['aqi_lag_24'] == rows['aqi'] - 24).all()
+        assert (rows['pm25_lag_24'] == rows['pm25'] - 24).all()
+
+def test_prepare_features_keeps_missing_pollutants_as_nan(tmp_path):
+    df = AQIModelTrainer(model_path=str(tmp_path)).prepare_features(make_frame())
+    
+    assert df.loc[df['city'] == 'B', 'o3'].isna().all()
+    assert (df.loc[df['city'] == 'A', 'o3'] == 5.0).all()
+
+def test_prepare_features_returns_time_order(tmp_path):
+    df = AQIModelTrainer(model_path=str(tmp_path)).prepare_features(make_frame())
+    
+    assert df['timestamp'].is_monotonic_increasing
@@ -26,19 +26,10 @@ async function seedLocations() {
   const spinner = ora('Adding default monitoring locations...').start();
   try {
     const script = `
-from database import SessionLocal
-from ml.data_collector import DataCollector
-
-db = SessionLocal()
-try:
-    collector = DataCollector(db)
-    collector.initialize_default_locations()
-    print('Locations added successfully')
-except Exception as e:
-    print(f'Error: {e}')
-    raise
-finally:
-    db.close()
+import asyncio
+from main import initialize_default_locations
+asyncio.run(initialize_default_locations())
+print('Locations added successfully')
 `;
     await execPromise(`docker-compose exec -T backend python -c "${script.replace(/\n/g, '; ')}"`);
     spinner.succeed('Default locations added');
@@ -54,19 +45,10 @@ async function collectData() {
   const spinner = ora('Collecting AQI data for all locations...').start();
   try {
     const script = `
-from database import SessionLocal
-from ml.data_collector import DataCollector
-
-db = SessionLocal()
-try:
-    collector = DataCollector(db)
-    count = collector.collect_all_active_locations()
-    print(f'Data collected for {count} locations')
-except Exception as e:
-    print(f'Error: {e}')
-    raise
-finally:
-    db.close()
+import asyncio
+from main import collect_active_locations
+count = asyncio.run(collect_active_locations())
+print(f'Data collected for {count} locations')
 `;
     const output = await execPromise(`docker-compose exec -T backend python -c "${script.replace(/\n/g, '; ')}"`);
     spinner.succeed('Data collection complete');
@@ -164,7 +164,7 @@ async function waitForDatabase() {
 async function initializeDatabase() {
   const spinner = ora('Initializing database...').start();
   try {
-    await execPromise('docker-compose exec -T backend python -c "from database import init_db; init_db()"');
+    await execPromise('docker-compose exec -T backend python -c "import asyncio; from database import init_db; asyncio.run(init_db())"');
     spinner.succeed('Database initialized');
     return true;
   } catch (error) {
@@ -178,19 +178,10 @@ async function seedLocations() {
   const spinner = ora('Adding default monitoring locations...').start();
   try {
     const script = `
-from database import SessionLocal
-from ml.data_collector import DataCollector
-
-db = SessionLocal()
-try:
-    collector = DataCollector(db)
-    collector.initialize_default_locations()
-    print('Default locations added')
-except Exception as e:
-    print(f'Error: {e}')
-    raise
-finally:
-    db.close()
+import asyncio
+from main import initialize_default_locations
+asyncio.run(initialize_default_locations())
+print('Default locations added')
 `;
     await execPromise(`docker-compose exec -T backend python -c "${script.replace(/\n/g, '; ')}"`);
     spinner.succeed('Default locations added');
@@ -206,19 +197,10 @@ async function collectInitialData() {
   const spinner = ora('Collecting initial AQI data (this may take 1-2 minutes)...').start();
   try {
     const script = `
-from database import SessionLocal
-from ml.data_collector import DataCollector
-
-db = SessionLocal()
-try:
-    collector = DataCollector(db)
-    count = collector.collect_all_active_locations()
-    print(f'Collected data for {count} locations')
-except Exception as e:
-    print(f'Error: {e}')
-    raise
-finally:
-    db.close()
+import asyncio
+from main import collect_active_locations
+count = asyncio.run(collect_active_locations())
+print(f'Collected data for {count} locations')
 `;
     await execPromise(`docker-compose exec -T backend python -c "${script.replace(/\n/g, '; ')}"`);
     spinner.succeed('Initial data collection complete');